@@ -28,30 +28,34 @@ Full explanation of fields:
 """
 
 import argparse
-import csv
 import sys
+from dataclasses import dataclass
+from functools import lru_cache
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 
 
-def parse_float(s):
-    if not s:
-        return 0
-    return float(s)
+@lru_cache(maxsize=128)
+def _grid_curve(plan_values, start, stop, n, months, visits, tax):
+    # memoized Plan.grid_cost_curve, keyed on the plan's attribute values and
+    # the grid's parameters rather than on the bills themselves
+    curve = Plan(*plan_values).cost_curve(np.linspace(start, stop, n), months, visits, tax)
+    curve.setflags(write=False)
+    return curve
 
 
 class Plan(object):
-    @classmethod
-    def from_csv(cls, line):
-        return cls(
-            name=line['name'],
-            monthly_premium=parse_float(line['monthly_premium']),
-            deductible=parse_float(line['deductible']),
-            out_of_pocket_max=parse_float(line['out_of_pocket_max']),
-            coinsurance=parse_float(line['coinsurance']),
-            employer_hsa_contribution=parse_float(line['employer_hsa_contribution']),
-            employee_hsa_contribution=parse_float(line['employee_hsa_contribution']),
-            copay=parse_float(line['copay']),
-        )
+    __slots__ = (
+        'monthly_premium',
+        'deductible',
+        'out_of_pocket_max',
+        'coinsurance',
+        'employer_hsa_contribution',
+        'employee_hsa_contribution',
+        'copay',
+        'name',
+    )
 
     def __init__(self, monthly_premium, deductible, out_of_pocket_max, coinsurance=0, employer_hsa_contribution=0, employee_hsa_contribution=0, copay=0, name=None):
         self.monthly_premium = monthly_premium
@@ -67,26 +71,153 @@ class Plan(object):
     def get_premium(self, months):
         return self.monthly_premium * months
 
-    def get_tax_savings(self, tax_bracket):
-        # print(self.employee_hsa_contribution, tax_bracket, self.employee_hsa_contribution * tax_bracket)
-        return self.employee_hsa_contribution * tax_bracket
+    def get_fixed_cost(self, months=12, tax_bracket=0):
+        # the part of the cost that doesn't depend on medical bills
+        return self.get_premium(months) - self.employer_hsa_contribution - self.employee_hsa_contribution * tax_bracket
 
     def get_expenses(self, total_expenses, visits=0):
+        # branchless, so it works unchanged on scalars and arrays
         copays = visits * self.copay
-        if (copays + total_expenses) < self.deductible:
-            expenses = copays + total_expenses
-        else:
-            expenses = copays + self.deductible + (total_expenses - copays - self.deductible) * self.coinsurance
-            if expenses > self.out_of_pocket_max:
-                expenses = self.out_of_pocket_max
-        return expenses
+        return np.minimum(
+            copays
+            + np.minimum(total_expenses, self.deductible)
+            + np.maximum(total_expenses - self.deductible, 0) * self.coinsurance,
+            self.out_of_pocket_max,
+        )
 
     def get_actual_cost(self, total_expenses, months=12, visits=0, tax_bracket=0):
-        # print(self.name, self.get_premium(months), self.get_expenses(total_expenses, visits=visits), self.employer_hsa_contribution, self.employee_hsa_contribution, self.get_tax_savings(tax_bracket))
-        return self.get_premium(months) + self.get_expenses(total_expenses, visits=visits) - self.employer_hsa_contribution - self.get_tax_savings(tax_bracket)
+        return self.get_fixed_cost(months, tax_bracket) + self.get_expenses(total_expenses, visits=visits)
+
+    def cost_curve(self, bills_arr, months=12, visits=0, tax=0):
+        # vectorized get_actual_cost over an array of total medical bills
+        return self.get_actual_cost(np.asarray(bills_arr), months=months, visits=visits, tax_bracket=tax)
+
+    def grid_cost_curve(self, start, stop, n, months=12, visits=0, tax=0):
+        # cost_curve at np.linspace(start, stop, n), cached since the same plan
+        # is often costed with the same arguments; the result is read-only
+        plan_values = (
+            self.monthly_premium, self.deductible, self.out_of_pocket_max, self.coinsurance,
+            self.employer_hsa_contribution, self.employee_hsa_contribution, self.copay,
+        )
+        return _grid_curve(plan_values, start, stop, n, months, visits, tax)
+
+    def __call__(self, total_expenses, months=12, visits=0, tax_bracket=0):
+        # get_actual_cost with the helper calls inlined, for scalar callers
+        expenses = min(
+            visits * self.copay
+            + min(total_expenses, self.deductible)
+            + max(total_expenses - self.deductible, 0) * self.coinsurance,
+            self.out_of_pocket_max,
+        )
+        return self.monthly_premium * months + expenses - self.employer_hsa_contribution - self.employee_hsa_contribution * tax_bracket
+
+
+@lru_cache(maxsize=None)
+def _compute_costs_kernel():
+    # numba is only imported (and the kernel only compiled) the first time a
+    # dense grid is requested, so plotting doesn't pay for it
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def compute_costs(premiums, deductibles, coins, oop, copays, hsa_emp, hsa_eee, months, visits, tax, n_bills, out):
+        # fused loop version of PlanTable.cost_matrix over bills 0..n_bills-1,
+        # written into out[plan, bill] without any temporary arrays
+        for p in prange(premiums.size):
+            plan_copays = visits * copays[p]
+            fixed = premiums[p] * months - hsa_emp[p] - hsa_eee[p] * tax
+            for b in range(n_bills):
+                expenses = min(plan_copays + min(b, deductibles[p]) + max(b - deductibles[p], 0.0) * coins[p], oop[p])
+                out[p, b] = fixed + expenses
+        return out
+
+    return compute_costs
+
+
+@dataclass
+class PlanTable(object):
+    # one column per plan attribute, so every plan can be costed in one broadcast
+    names: list
+    premiums: np.ndarray
+    deductibles: np.ndarray
+    coinsurances: np.ndarray
+    oop_max: np.ndarray
+    copays: np.ndarray
+    hsa_emp: np.ndarray
+    hsa_eee: np.ndarray
+
+    @classmethod
+    def from_csv(cls, f):
+        df = pd.read_csv(f, dtype={'name': str})
+        numeric = [
+            'monthly_premium',
+            'deductible',
+            'coinsurance',
+            'out_of_pocket_max',
+            'copay',
+            'employer_hsa_contribution',
+            'employee_hsa_contribution',
+        ]
+        df[numeric] = df[numeric].fillna(0.0)
+        df['name'] = df['name'].fillna('')
+        return cls(
+            names=df['name'].tolist(),
+            premiums=df['monthly_premium'].to_numpy(dtype=np.float64),
+            deductibles=df['deductible'].to_numpy(dtype=np.float64),
+            coinsurances=df['coinsurance'].to_numpy(dtype=np.float64),
+            oop_max=df['out_of_pocket_max'].to_numpy(dtype=np.float64),
+            copays=df['copay'].to_numpy(dtype=np.float64),
+            hsa_emp=df['employer_hsa_contribution'].to_numpy(dtype=np.float64),
+            hsa_eee=df['employee_hsa_contribution'].to_numpy(dtype=np.float64),
+        )
 
-    def __call__(self, *args, **kwargs):
-        return self.get_actual_cost(*args, **kwargs)
+    def __len__(self):
+        return len(self.names)
+
+    def breakpoints(self, medical_bills, visits=0):
+        # every cost curve is piecewise linear, so evaluating it at its kinks
+        # is enough to draw it
+        copays = visits * self.copays
+        with np.errstate(divide='ignore', invalid='ignore'):
+            oop_met = np.where(
+                self.coinsurances > 0,
+                self.deductibles + (self.oop_max - copays - self.deductibles) / self.coinsurances,
+                self.deductibles,
+            )
+        xs = np.stack([
+            np.zeros(len(self)),
+            self.deductibles,
+            self.oop_max - copays,
+            oop_met,
+            np.full(len(self), medical_bills, dtype=np.float64),
+        ], axis=1)
+        return np.sort(np.clip(xs, 0, medical_bills), axis=1)
+
+    def fixed_costs(self, months=12, tax=0):
+        # Plan.get_fixed_cost for every plan
+        return self.premiums * months - self.hsa_emp - self.hsa_eee * tax
+
+    def cost_matrix(self, bills, months=12, visits=0, tax=0):
+        # (n_plans, n_bills) matrix of Plan.cost_curve for every plan; bills
+        # may be shared by all plans (1-D) or given per plan (2-D)
+        bills = np.asarray(bills, dtype=np.float64)
+        if bills.ndim == 1:
+            bills = bills[None, :]
+        deductibles = self.deductibles[:, None]
+        expenses = np.minimum(
+            visits * self.copays[:, None]
+            + np.minimum(bills, deductibles)
+            + np.maximum(bills - deductibles, 0) * self.coinsurances[:, None],
+            self.oop_max[:, None],
+        )
+        return expenses + self.fixed_costs(months, tax)[:, None]
+
+    def cost_grid(self, n_bills, months=12, visits=0, tax=0):
+        # cost_matrix at every whole dollar in range(n_bills), via the compiled kernel
+        out = np.empty((len(self), n_bills), dtype=np.float64)
+        return _compute_costs_kernel()(
+            self.premiums, self.deductibles, self.coinsurances, self.oop_max, self.copays,
+            self.hsa_emp, self.hsa_eee, months, visits, tax, n_bills, out,
+        )
 
 
 if __name__ == '__main__':
@@ -95,20 +226,24 @@ if __name__ == '__main__':
     parser.add_argument('--months', type=int, default=12, help="number of months in this plan's coverage period (usually 12)")
     parser.add_argument('--visits', type=int, default=0, help="expected number of office visits")
     parser.add_argument('--tax', type=float, default=0, help="expected highest marginal income tax rate (when making HSA contributions)")
+    parser.add_argument('--points', type=int, default=None, help="sample this many evenly spaced medical bill amounts instead of each plan's breakpoints")
     args = parser.parse_args()
-
-    reader = csv.DictReader(sys.stdin)
-    plans = [Plan.from_csv(line) for line in reader]
-
-    for p in plans:
-        plt.plot(
-            range(args.medical_bills),
-            [p(c, args.months, args.visits, args.tax) for c in range(args.medical_bills)],
-            label=p.name
-        )
-
-    plt.title("Health Insurance Comparison")
-    plt.xlabel("Medical Bills")
-    plt.ylabel("You Pay")
-    plt.legend()
+    if args.points is not None and args.points < 2:
+        parser.error("--points must be at least 2")
+
+    plans = PlanTable.from_csv(sys.stdin)
+
+    if args.points is not None:
+        xs = np.linspace(0, args.medical_bills, args.points)
+    else:
+        xs = plans.breakpoints(args.medical_bills, args.visits)
+    costs = plans.cost_matrix(xs, args.months, args.visits, args.tax)
+    xs = np.broadcast_to(xs, costs.shape)
+
+    fig, ax = plt.subplots()
+    lines = ax.plot(xs.T, costs.T)
+    ax.set_title("Health Insurance Comparison")
+    ax.set_xlabel("Medical Bills")
+    ax.set_ylabel("You Pay")
+    ax.legend(lines, plans.names)
     plt.show()
@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+
+from health_insurance import Plan, PlanTable
+
+PLANS_CSV = """\
+name,monthly_premium,deductible,copay,coinsurance,out_of_pocket_max,employer_hsa_contribution,employee_hsa_contribution
+"HSA 2000-20",100,2000,25,0.20,5000,300,1000
+"Low OOP",50,3000,25,0.30,1500,,
+"""
+
+MONTHS, VISITS, TAX = 12, 4, 0.2
+
+
+@pytest.fixture
+def table():
+    return PlanTable.from_csv(io.StringIO(PLANS_CSV))
+
+
+@pytest.fixture
+def plans():
+    return [
+        Plan(100, 2000, 5000, coinsurance=0.2, employer_hsa_contribution=300, employee_hsa_contribution=1000, copay=25),
+        Plan(50, 3000, 1500, coinsurance=0.3, copay=25),
+    ]
+
+
+@pytest.mark.parametrize('plan, bills, expected', [
+    # premiums 1200 - employer HSA 300 - tax savings 200, plus 100 in copays
+    (0, 1000, 700 + 100 + 1000),  # below the deductible
+    (0, 7000, 700 + 100 + 2000 + 5000 * 0.2),  # after the deductible
+    (0, 16500, 700 + 5000),  # exactly at the out of pocket max
+    (0, 30000, 700 + 5000),  # past the out of pocket max
+    (1, 1000, 600 + 100 + 1000),  # out of pocket max below the deductible
+    (1, 2000, 600 + 1500),
+])
+def test_known_costs(plans, plan, bills, expected):
+    assert plans[plan](bills, MONTHS, VISITS, TAX) == pytest.approx(expected)
+
+
+def test_paths_agree(plans, table):
+    bills = np.arange(20000)
+    expected = np.array([[p(b, MONTHS, VISITS, TAX) for b in bills] for p in plans])
+
+    np.testing.assert_allclose([p.get_actual_cost(bills, MONTHS, VISITS, TAX) for p in plans], expected)
+    np.testing.assert_allclose([p.cost_curve(bills, MONTHS, VISITS, TAX) for p in plans], expected)
+    np.testing.assert_allclose(table.cost_matrix(bills, MONTHS, VISITS, TAX), expected)
+    np.testing.assert_allclose(table.cost_grid(bills.size, MONTHS, VISITS, TAX), expected)
+
+    xs = table.breakpoints(bills[-1], VISITS)
+    costs = table.cost_matrix(xs, MONTHS, VISITS, TAX)
+    np.testing.assert_allclose([np.interp(bills, x, c) for x, c in zip(xs, costs)], expected)
+
+    grid = np.linspace(0, 10000, 11)
+    for p in plans:
+        np.testing.assert_allclose(
+            p.grid_cost_curve(0, 10000, 11, MONTHS, VISITS, TAX),
+            [p(b, MONTHS, VISITS, TAX) for b in grid],
+        )